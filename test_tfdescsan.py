@@ -0,0 +1,265 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import importlib
+import importlib.util
+from unittest import mock
+
+HAVE_HCL = importlib.util.find_spec('hcl2') is not None or importlib.util.find_spec('hcl') is not None
+if HAVE_HCL:
+    import tfdescsan
+    from tfdescsan import TFVarDesc
+
+TSV = ('variable\tdescription\taws\tgcp\tazure\n'
+       'foo\tFoo desc\t(aws)\t(gcp)\t(azure)\n'
+       'bar\tBar desc\n')
+
+
+@unittest.skipUnless(HAVE_HCL, 'Neither the hcl2 nor the hcl module is installed')
+class TestTFVarDesc(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tsv_path = os.path.join(self._tmp.name, 'mapping.tsv')
+        self.var_path = os.path.join(self._tmp.name, 'variables.tf')
+        with open(self.tsv_path, 'w') as tsv_out:
+            tsv_out.write(TSV)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def update(self, variables, cloud='aws', strict=False):
+        """Run TFVarDesc on a variables.tf with the given content and return the updated content
+        """
+        with open(self.var_path, 'w') as var_out:
+            var_out.write(variables)
+        return TFVarDesc(self.tsv_path, self.var_path, cloud, strict).updated_variables
+
+    def test_insert_multi_line(self):
+        self.assertEqual(self.update('variable "foo" {\n    default = 1\n}\n'),
+                         'variable "foo" {\n    description = "Foo desc (aws)"\n    default = 1\n}\n')
+
+    def test_insert_one_line_empty(self):
+        self.assertEqual(self.update('variable "foo" {}\n'),
+                         'variable "foo" {\n  description = "Foo desc (aws)"\n}\n')
+
+    def test_insert_one_line_keeps_content(self):
+        self.assertEqual(self.update('variable "foo" { default = 1 }\n'),
+                         'variable "foo" {\n  default = 1\n  description = "Foo desc (aws)"\n}\n')
+
+    def test_insert_brace_on_next_line(self):
+        self.assertEqual(self.update('variable "bar"\n{\n  default = "b"\n}\n'),
+                         'variable "bar"\n{\n  description = "Bar desc"\n  default = "b"\n}\n')
+
+    def test_insert_comment_before_brace(self):
+        self.assertEqual(self.update('variable "foo" # c\n{\n  default = 1\n}\n'),
+                         'variable "foo" # c\n{\n  description = "Foo desc (aws)"\n  default = 1\n}\n')
+        self.assertEqual(self.update('variable "foo" /* c */ { default = 1 }\n'),
+                         'variable "foo" /* c */ {\n  default = 1\n  description = "Foo desc (aws)"\n}\n')
+
+    def test_update(self):
+        self.assertEqual(self.update('variable "foo" {\n  description = "old foo"\n  default = 1\n}\n'),
+                         'variable "foo" {\n  description = "Foo desc (aws)"\n  default = 1\n}\n')
+
+    def test_update_ignores_description_in_other_values(self):
+        self.assertEqual(self.update('variable "foo" {\n  default = "no description here"\n'
+                                     '  description = "old foo"\n}\n'),
+                         'variable "foo" {\n  default = "no description here"\n'
+                         '  description = "Foo desc (aws)"\n}\n')
+
+    def test_update_without_cloud(self):
+        self.assertEqual(self.update('variable "foo" {\n  description = "old foo"\n}\n', cloud=None),
+                         'variable "foo" {\n  description = "Foo desc"\n}\n')
+
+    def test_update_nested_block(self):
+        self.assertEqual(self.update('variable "foo" {\n  default = { a = "${var.x}" }\n'
+                                     '  description = "old foo"\n}\n'),
+                         'variable "foo" {\n  default = { a = "${var.x}" }\n'
+                         '  description = "Foo desc (aws)"\n}\n')
+
+    def test_update_heredoc(self):
+        self.assertEqual(self.update('variable "foo" {\n  description = <<EOT\nold foo\nEOT\n}\n'),
+                         'variable "foo" {\n  description = "Foo desc (aws)"\n}\n')
+
+    def test_heredoc_in_good_state(self):
+        variables = 'variable "bar" {\n  description = <<EOT\nBar desc\nEOT\n}\n'
+        self.assertEqual(self.update(variables), variables)
+
+    def test_comments_are_ignored(self):
+        self.assertEqual(self.update('# variable "foo" {}\n/* variable "bar" {} */\n'
+                                     'variable "foo" {\n  default = 1\n}\n'),
+                         '# variable "foo" {}\n/* variable "bar" {} */\n'
+                         'variable "foo" {\n  description = "Foo desc (aws)"\n  default = 1\n}\n')
+
+    def test_unchanged(self):
+        variables = 'variable "bar" {\n  description = "Bar desc"\n}\n\nvariable "unknown" {}\n'
+        self.assertEqual(self.update(variables), variables)
+
+    def test_changed(self):
+        for variables, changed in (('variable "foo" {}\n', True),
+                                   ('variable "foo" {\n  description = "old foo"\n}\n', True),
+                                   ('variable "foo" {\n  description = "Foo desc (aws)"\n}\n', False),
+                                   ('variable "unknown" {}\n', False)):
+            with open(self.var_path, 'w') as var_out:
+                var_out.write(variables)
+            for verify in (False, True):
+                with self.subTest(variables=variables, verify=verify):
+                    self.assertEqual(TFVarDesc(self.tsv_path, self.var_path, 'aws', verify=verify).changed, changed)
+
+    def cached_mapping(self, tsv, mtime_offset_ns=0):
+        """Cache the mapping of the tsv file, replace its content and return the mapping TFVarDesc reads
+        """
+        self.assertEqual(TFVarDesc(self.tsv_path, None, cache=True).vardesc['bar'][0], 'Bar desc')
+        st = os.stat(self.tsv_path)
+        with open(self.tsv_path, 'w') as tsv_out:
+            tsv_out.write(tsv)
+        os.utime(self.tsv_path, ns=(st.st_atime_ns, st.st_mtime_ns + mtime_offset_ns))
+        return TFVarDesc(self.tsv_path, None, cache=True).vardesc
+
+    def test_cache_hit(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': os.path.join(self._tmp.name, 'cache')}):
+            # same size and mtime - the cached mapping is used even though the content changed
+            self.assertEqual(self.cached_mapping(TSV.replace('Bar desc', 'Bar DESC'))['bar'][0], 'Bar desc')
+
+    def test_cache_stale(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': os.path.join(self._tmp.name, 'cache')}):
+            self.assertEqual(self.cached_mapping(TSV.replace('Bar desc', 'Bar DESC'), 10 ** 9)['bar'][0], 'Bar DESC')
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), 'No file ownership on this platform')
+    def test_cache_not_private(self):
+        cache_home = os.path.join(self._tmp.name, 'cache')
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_home}):
+            TFVarDesc(self.tsv_path, None, cache=True).vardesc
+            os.chmod(os.path.join(cache_home, 'tfdescsan'), 0o777)
+            with self.assertLogs(level='WARNING') as logs:
+                self.assertEqual(self.cached_mapping(TSV.replace('Bar desc', 'Bar DESC'))['bar'][0], 'Bar DESC')
+        self.assertIn('not private', logs.output[0])
+
+    def mapping(self, tsv):
+        """Return the description mapping TFVarDesc reads from a tsv file with the given content
+        """
+        with open(self.tsv_path, 'w') as tsv_out:
+            tsv_out.write(tsv)
+        return TFVarDesc(self.tsv_path, None).vardesc
+
+    MESSY_TSV = ('\n'
+                 'variable\tdescription\taws\tgcp\tazure\n'
+                 'foo\tFoo "desc"\t(aws)\t(gcp)\t(azure)\textra\n'
+                 '\n'
+                 'bar\tBar desc\n'
+                 'baz\n')
+    MESSY_VARDESC = {'foo': ("Foo 'desc'", '(aws)', '(gcp)', '(azure)'),
+                     'bar': ('Bar desc', '', '', ''),
+                     'baz': ('', '', '', '')}
+
+    @unittest.skipUnless(importlib.util.find_spec('pandas'), 'The pandas module is not installed')
+    def test_mapping_pandas(self):
+        self.assertEqual(self.mapping(self.MESSY_TSV), self.MESSY_VARDESC)
+
+    def test_mapping_csv(self):
+        with mock.patch.dict(sys.modules, {'pandas': None}):
+            self.assertEqual(self.mapping(self.MESSY_TSV), self.MESSY_VARDESC)
+
+    def test_strict(self):
+        for name, (hcl2, hcl) in hcl_parsers().items():
+            with self.subTest(parser=name), mock.patch.object(tfdescsan, 'hcl2', hcl2), \
+                    mock.patch.object(tfdescsan, 'hcl', hcl):
+                self.assertEqual(self.update('variable "foo" {\n  description = "old"\n}\n', strict=True),
+                                 'variable "foo" {\n  description = "Foo desc (aws)"\n}\n')
+
+
+@unittest.skipUnless(HAVE_HCL, 'Neither the hcl2 nor the hcl module is installed')
+@mock.patch('tfdescsan._setup_logging', mock.Mock())
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tsv_path = os.path.join(self._tmp.name, 'mapping.tsv')
+        with open(self.tsv_path, 'w') as tsv_out:
+            tsv_out.write(TSV)
+        self.var_paths = []
+        for name, variables in (('good', 'variable "bar" {\n  description = "Bar desc"\n}\n'),
+                                ('bad', 'variable "foo" {}\n')):
+            os.mkdir(os.path.join(self._tmp.name, name))
+            self.var_paths.append(os.path.join(self._tmp.name, name, 'variables.tf'))
+            with open(self.var_paths[-1], 'w') as var_out:
+                var_out.write(variables)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def main(self, *argv):
+        """Run main with the given arguments and return its exit code
+        """
+        with self.assertRaises(SystemExit) as cm, mock.patch('sys.stderr', io.StringIO()):
+            tfdescsan.main(['-m', self.tsv_path] + list(argv))
+        return cm.exception.code
+
+    def test_multiple_files_need_inplace_or_test(self):
+        self.assertEqual(self.main('-f', *self.var_paths), 2)
+        self.assertEqual(self.main('-f', *self.var_paths, '-o', os.path.join(self._tmp.name, 'out.tf')), 2)
+
+    def test_test_fails_if_any_file_needs_changes(self):
+        self.assertEqual(self.main('-t', '-f', self.var_paths[0]), 0)
+        self.assertEqual(self.main('-t', '-f', *self.var_paths), 1)
+        self.assertEqual(self.main('-t', '-f', *reversed(self.var_paths)), 1)
+        with open(self.var_paths[1]) as var_in:
+            self.assertEqual(var_in.read(), 'variable "foo" {}\n')
+
+    def test_inplace(self):
+        self.assertEqual(self.main('-i', '-c', 'aws', '-f', *self.var_paths), 0)
+        self.assertEqual(self.main('-t', '-c', 'aws', '-f', *self.var_paths), 0)
+        with open(self.var_paths[1]) as var_in:
+            self.assertEqual(var_in.read(), 'variable "foo" {\n  description = "Foo desc (aws)"\n}\n')
+
+    def test_duplicate_paths_are_processed_once(self):
+        good = self.var_paths[0]
+        with mock.patch.object(tfdescsan, '_process_one', return_value=(False, [], None)) as process_one:
+            self.assertEqual(self.main('-t', '-f', good, os.path.join(os.path.dirname(good), '.', 'variables.tf'),
+                                       os.path.join(self._tmp.name, 'g*', 'variables.tf')), 0)
+        self.assertEqual(process_one.call_count, 1)
+
+
+def hcl_parsers():
+    """Return the (hcl2, hcl) module attributes tfdescsan should use to select each installed HCL parser
+    """
+    parsers = {}
+    if importlib.util.find_spec('hcl2') is not None:
+        parsers['hcl2'] = (importlib.import_module('hcl2'), None)
+    if importlib.util.find_spec('hcl') is not None:
+        parsers['hcl'] = (None, importlib.import_module('hcl'))
+    return parsers
+
+
+@unittest.skipUnless(HAVE_HCL, 'Neither the hcl2 nor the hcl module is installed')
+class TestHclLoad(unittest.TestCase):
+    HCL = ('variable "foo" {\n'
+           '  description = "has \\"quotes\\""\n'
+           '  default = ["a"]\n'
+           '}\n'
+           'variable "bar" {\n'
+           '  description = <<EOT\n'
+           'Bar desc\n'
+           'EOT\n'
+           '  default = { a = "${var.x}", b = 1 }\n'
+           '}\n')
+
+    def test_hcl_load(self):
+        for name, (hcl2, hcl) in hcl_parsers().items():
+            with self.subTest(parser=name), mock.patch.object(tfdescsan, 'hcl2', hcl2), \
+                    mock.patch.object(tfdescsan, 'hcl', hcl):
+                self.assertEqual(tfdescsan.hcl_load(io.StringIO(self.HCL)),
+                                 {'variable': {'foo': {'description': 'has "quotes"', 'default': ['a']},
+                                               'bar': {'description': 'Bar desc',
+                                                       'default': {'a': '${var.x}', 'b': 1}}}})
+
+    def test_hcl_load_invalid(self):
+        for name, (hcl2, hcl) in hcl_parsers().items():
+            with self.subTest(parser=name), mock.patch.object(tfdescsan, 'hcl2', hcl2), \
+                    mock.patch.object(tfdescsan, 'hcl', hcl):
+                with self.assertRaises(ValueError):
+                    tfdescsan.hcl_load(io.StringIO('variable "foo" {\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,21 +4,54 @@ import io
 import sys
 import re
 import csv
+import pickle
+import hashlib
+import glob
+import itertools
 import tempfile
 import logging
 import argparse
+import importlib.metadata
 try:
-    import hcl
+    # prefer the lark based hcl2 parser whose grammar is built once and cached
+    import hcl2
+    from lark.exceptions import LarkError  # hcl2 is built on lark and raises its parse errors
+    # hcl_load() normalizes the layout of hcl2 8.x - older releases return something different
+    if int(importlib.metadata.version('python-hcl2').split('.')[0]) < 8:
+        raise ImportError('python-hcl2 8.0 or later is required')
+    hcl = None
 except ImportError:
-    print('Error: Python hcl module missing!\nTry installing via:\n  $ pip install pyhcl')
-    print('HCL is the HashiCorp configuration language.\nSee https://github.com/hashicorp/hcl for details.')
-    sys.exit(2)
+    hcl2 = None
+    try:
+        import hcl
+    except ImportError:
+        print('Error: Python hcl module missing!\nTry installing via:\n  $ pip install pyhcl')
+        print('HCL is the HashiCorp configuration language.\nSee https://github.com/hashicorp/hcl for details.')
+        sys.exit(2)
+
+_BUFFER_SIZE = 1 << 20  # 1 MiB read/write buffer for variables.tf and tsv files
+_SESSION = None  # shared requests.Session so consecutive tsv downloads reuse their connection
+_WORKER_VARDESC = None  # description mapping loaded once by the parent process and handed to every worker
+_HCL2_HEREDOC_RE = re.compile(r'<<-?(?P<tag>[A-Za-z_][\w-]*)\n(?P<body>.*)\n[ \t]*(?P=tag)\Z', re.DOTALL)
+_WS_RE = re.compile(r'^(?P<whitespace>[\t ]+)', re.MULTILINE)
+# tokens of the HCL subset we need to find variable blocks and their descriptions - comments, strings
+# and heredocs are matched as a whole so nothing inside of them is mistaken for a variable or bracket
+_TOKEN_RE = re.compile(r'(?P<comment>#[^\n]*|//[^\n]*|/\*.*?\*/)'
+                       r'|(?P<heredoc><<-?(?P<tag>[A-Za-z_][\w-]*)[ \t]*\n(?P<heredoc_body>.*?)^[ \t]*(?P=tag)[ \t]*$)'
+                       r'|(?P<string>"(?:[^"\\\n]|\\.)*")'
+                       r'|(?P<header>\b(?P<kind>variable|output)\s+"(?P<variable>[^"]*)"'  # todo: single quotes?
+                       r'(?:\s|#[^\n]*|//[^\n]*|/\*.*?\*/)*\{)'
+                       r'|(?P<unopened>\b(?:variable|output)\s+"[^"]*")'
+                       r'|(?P<description>\bdescription\s*=\s*)'
+                       r'|(?P<open>\{)'
+                       r'|(?P<close>\})', re.DOTALL | re.MULTILINE)
 
 
 def main(argv):
     p = argparse.ArgumentParser(description='Parse terraform variables.tf and update variable descriptions')
     p.add_argument('--tsv', '-m', help='TSV description mapping file', dest='tsv_path', required=True)
-    p.add_argument('--var', '-f', help='Terraform variables.tf file', dest='var_path', required=True)
+    p.add_argument('--var', '-f', help='Terraform variables.tf file(s) or glob', dest='var_paths', nargs='+',
+                   metavar='VAR_PATH', required=True)
     pg = p.add_mutually_exclusive_group()
     pg.add_argument('--out', '-o', help='Output variables.tf file', dest='out_path', type=str)
     pg.add_argument('--inplace', '-i', help='Replace variables.tf in place', dest='inplace', action='store_true',
@@ -26,6 +59,12 @@ def main(argv):
     pg.add_argument('--test', '-t', help='Test only - exit > 0 on errors or warnings', dest='test',
                     action='store_true', default=False)
     p.add_argument('--cloud', '-c', help='Name of Cloud', dest='cloud')
+    p.add_argument('--strict', '-s', help='Parse variables.tf using the full HCL parser', dest='strict',
+                   action='store_true', default=False)
+    p.add_argument('--cache', help='Cache the parsed TSV mapping between runs', dest='cache',
+                   action=argparse.BooleanOptionalAction, default=False)
+    p.add_argument('--verify', help='Compare file contents instead of trusting the change tracking', dest='verify',
+                   action='store_true', default=False)
     p.add_argument('--verbose', '-v', help='Verbose logging', dest='verbose', action='store_true', default=False)
     args = p.parse_args(argv)
 
@@ -33,36 +72,154 @@ def main(argv):
     log_level = logging.INFO
     if args.verbose:
         log_level = logging.DEBUG
+    _setup_logging(log_level)
+
+    # expand globs the shell didn't expand for us e.g. because they were quoted
+    var_paths = [path for pattern in args.var_paths for path in sorted(glob.glob(pattern)) or [pattern]]
+    # overlapping globs must not hand the same file to two jobs that would both replace it
+    unique_paths = {}
+    for path in var_paths:
+        unique_paths.setdefault(os.path.realpath(path), path)
+    var_paths = list(unique_paths.values())
+    if len(var_paths) > 1 and not (args.inplace or args.test):
+        # the updated files would end up unlabelled back to back on stdout
+        p.error('argument --var/-f: more than one variables.tf file requires --inplace or --test')
+
+    # do the work - every variables.tf file is independent so multiple files are processed in parallel
+    jobs = [(args.tsv_path, var_path, args.cloud, args.strict, args.cache, args.verify, args.out_path, args.inplace,
+             args.test) for var_path in var_paths]
+    if len(jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        # load the description mapping only once instead of downloading and parsing it in every job
+        vardesc = TFVarDesc(args.tsv_path, None, args.cloud, cache=args.cache).vardesc
+        with ProcessPoolExecutor(initializer=_init_worker, initargs=(log_level, vardesc)) as executor:
+            results = list(executor.map(_process_one, jobs))
+    else:
+        results = [_process_one(job) for job in jobs]
+
+    missing = Missing()
+    for changed, missing_variables, updated_variables in results:
+        missing.data.extend(missing_variables)
+        if args.test:
+            # if anything was changed or there were missing mappings
+            if changed or len(missing.data) > 0:
+                sys.exit(1)
+        elif updated_variables is not None:
+            print(updated_variables)  # dump the updated variables.tf to stdout
 
+    missing.process()  # do something with the list of missing variables
+
+    sys.exit(0)  # explicit exit for readability
+
+
+def _setup_logging(log_level):
+    """Log to stderr at the given level
+
+    :param log_level: The log level e.g. logging.INFO
+    """
     root = logging.getLogger()
-    root.setLevel(logging.DEBUG)
+    root.setLevel(log_level)  # so debug records aren't even created unless we're verbose
     ch = logging.StreamHandler(sys.stderr)
     ch.setLevel(log_level)
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     ch.setFormatter(formatter)
     root.addHandler(ch)
 
-    # do the work
-    tfd = TFVarDesc(args.tsv_path, args.var_path, args.cloud)
+
+def _init_worker(log_level, vardesc):
+    """Initialize a ProcessPoolExecutor worker process
+
+    :param log_level: The log level of the parent process
+    :param vardesc: The description mapping loaded by the parent process
+    """
+    global _WORKER_VARDESC
+    _WORKER_VARDESC = vardesc
+    # forked workers inherit the parent's logging setup, spawned ones start without any
+    if not logging.getLogger().handlers:
+        _setup_logging(log_level)
+
+
+def _process_one(job):
+    """Process a single variables.tf file.
+    This is a module level function so it can be pickled and run by a ProcessPoolExecutor.
+
+    :rtype: tuple
+    :param job: Tuple of (tsv_path, var_path, cloud, strict, cache, verify, out_path, inplace, test)
+    :return: Tuple of (changed, missing variables, updated variables.tf or None if it wasn't meant for stdout)
+    """
+    tsv_path, var_path, cloud, strict, cache, verify, out_path, inplace, test = job
+    tfd = TFVarDesc(tsv_path, var_path, cloud, strict, cache, verify, _WORKER_VARDESC)
     missing = Missing()
     tfd.register_mapping_missing_callback(missing.callback)
 
-    if args.test:
-        # if anything was changed or there were missing mappings
-        if tfd.variables != tfd.updated_variables or len(missing.data) > 0:
-            sys.exit(1)
-    elif args.out_path or args.inplace:
+    changed = tfd.changed
+    if test:
+        return changed, missing.data, None
+    elif out_path or inplace:
         # write the updated variables to either a new file or replace in-place
         # if the later we add a flag that tells the method to only replace
         # if content has changed
-        out_path = args.var_path if args.inplace else args.out_path
-        tfd.write_updated_variables(out_path, args.inplace)
-    else:
-        print(tfd.updated_variables)  # dump the updated variables.tf to stdout
+        tfd.write_updated_variables(var_path if inplace else out_path, inplace)
+        return changed, missing.data, None
+    return changed, missing.data, tfd.updated_variables
 
-    missing.process()  # do something with the list of missing variables
 
-    sys.exit(0)  # explicit exit for readability
+def _session():
+    """Return the module wide HTTP session, creating it on first use.
+
+    :rtype: requests.Session
+    :return: Session with connection pooling and compressed transfers enabled
+    """
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        _SESSION = requests.Session()
+        _SESSION.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    return _SESSION
+
+
+def hcl_load(fp):
+    """Load HCL from a file object using whichever HCL parser is installed.
+    hcl2 output is normalized to the layout returned by pyhcl.
+
+    :rtype: dict
+    :param fp: File object to read the HCL from
+    :return: The parsed HCL
+    """
+    if hcl2 is None:
+        return hcl.load(fp)
+    try:
+        hcl2_data = hcl2.load(fp)
+    except LarkError as e:
+        raise ValueError('Invalid HCL: {}'.format(e)) from e
+    hcl_data = {}
+    for key, value in hcl2_data.items():
+        if key in ('variable', 'output'):
+            # hcl2 returns a list of single item dicts for blocks
+            hcl_data[key] = {name: data for block in _hcl2_normalize(value) for name, data in block.items()}
+        else:
+            hcl_data[key] = _hcl2_normalize(value)
+    return hcl_data
+
+
+def _hcl2_normalize(value):
+    """Convert a value returned by hcl2 to what pyhcl would have returned.
+    hcl2 keeps the quotes around strings and block names and marks blocks with an '__is_block__' key.
+
+    :param value: The value returned by hcl2
+    :return: The normalized value
+    """
+    if isinstance(value, dict):
+        return {_hcl2_normalize(k): _hcl2_normalize(v) for k, v in value.items() if k != '__is_block__'}
+    if isinstance(value, list):
+        return [_hcl2_normalize(v) for v in value]
+    if isinstance(value, str) and len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        value = value[1:-1]
+        heredoc = _HCL2_HEREDOC_RE.match(value)
+        if heredoc:
+            return heredoc.group('body')
+        return value.replace('\\"', '"')
+    return value
 
 
 class Missing:
@@ -83,25 +240,37 @@ class Missing:
 class TFVarDesc:
     """Read and validate terraform variable descriptions
     """
-    def __init__(self, tsv_path, var_path, cloud=None):
+    def __init__(self, tsv_path, var_path, cloud=None, strict=False, cache=False, verify=False, vardesc=None):
         """Constructor
 
         :rtype: TFVarDesc
         :param tsv_path: Path to the tsv file containing the variable names and descriptions
         :param var_path: Path to the terraform variable.tf file
         :param cloud: Name of the cloud we're generating descriptions for
+        :param strict: Parse the variable.tf file using the full HCL parser instead of a regex scan
+        :param cache: Cache the parsed tsv file on disk and reuse it for as long as the tsv file doesn't change
+        :param verify: Compare the original and updated variables.tf instead of trusting the change tracking
+        :param vardesc: An already loaded description mapping to use instead of reading the tsv file
         :return: TFVarDesc object
         """
         self._tsv_path = tsv_path
         self._var_path = var_path
         self._cloud = cloud
+        self._strict = strict
+        self._cache = cache
+        self._verify = verify
+        self._dirty = False  # set once executing the plan actually modified the variables.tf
         self._log = logging.getLogger(self.__class__.__name__)
-        self.__vardesc = {}
+        self.__vardesc = vardesc if vardesc is not None else {}
         self._plan = {}
+        self._plan_frozen = frozenset()
         self.__mapping_missing_callbacks = []
         self.__variables = None
         self.__updated_variables = None
+        self.__scanned_blocks = None
         self.__tsv_format = ['variable', 'desc', 'aws', 'gcp', 'azure']
+        # index of the cloud specific appendix in a vardesc entry, which holds every column but the variable name
+        self._cloud_idx = self.__tsv_format.index(cloud) - 1 if cloud in self.__tsv_format[2:] else None
 
     def __repr__(self):
         return self.updated_variables
@@ -115,31 +284,171 @@ class TFVarDesc:
     def __fill_vardesc(self):
         """Read the tsv file into memory
         """
+        cache_path = self.__cache_path() if self._cache else None
+        cached = self.__read_cache(cache_path) if cache_path else None
+        is_url = self._tsv_path.startswith('http://') or self._tsv_path.startswith('https://')
+        if not is_url:
+            st = os.stat(self._tsv_path)
+            validator = (st.st_size, st.st_mtime_ns)
+            if cached and cached['validator'] == validator:
+                self._log.debug('Loading %s from cache %s', self._tsv_path, cache_path)
+                self.__vardesc = cached['vardesc']
+                return
+
+        try:
+            import pandas  # optional - its C parser is a lot faster on large mapping files
+        except ImportError:
+            pandas = None
+        tsv_close = None
+        try:
+            if is_url:
+                self._log.debug('Loading %s from network into memory', self._tsv_path)
+                try:
+                    import requests  # noqa: F401 - only checking that it is available
+                except ImportError:
+                    error_msg = 'Error: Python requests module missing! Try installing via: $ pip install requests'
+                    self._log.fatal(error_msg)
+                    raise RuntimeError(error_msg)
+                headers = {}
+                if cached:
+                    etag, last_modified = cached['validator']
+                    if etag:
+                        headers['If-None-Match'] = etag
+                    if last_modified:
+                        headers['If-Modified-Since'] = last_modified
+                # stream the response so we can parse rows while they're still arriving
+                resp = _session().get(self._tsv_path, stream=True, headers=headers)
+                tsv_close = resp.close
+                if resp.status_code == 304 and cached:
+                    self._log.debug('%s not modified - loading from cache %s', self._tsv_path, cache_path)
+                    self.__vardesc = cached['vardesc']
+                    return
+                resp.raise_for_status()
+                validator = (resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+                if validator == (None, None):
+                    validator = None  # without either header we can't tell when the cache is stale
+                if pandas is not None:
+                    resp.raw.decode_content = True  # let urllib3 undo any content encoding before pandas reads it
+                    tsv_in = resp.raw
+                else:
+                    if resp.encoding is None:
+                        resp.encoding = 'utf-8'
+                    tsv_in = (line for line in resp.iter_lines(decode_unicode=True) if line)
+            else:
+                self._log.debug('Loading %s from disk into memory', self._tsv_path)
+                tsv_in = open(self._tsv_path, 'r', buffering=_BUFFER_SIZE, newline='')
+                tsv_close = tsv_in.close
+            if pandas is not None:
+                try:
+                    # usecols drops any columns past the ones we know instead of failing on them like csv does
+                    df = pandas.read_csv(tsv_in, sep='\t', header=None, names=self.__tsv_format,
+                                         usecols=range(len(self.__tsv_format)), index_col=False, dtype=str,
+                                         keep_default_na=False, encoding='utf-8', engine='c')
+                except pandas.errors.EmptyDataError:
+                    df = pandas.DataFrame(columns=self.__tsv_format, dtype=str)
+                if len(df) > 0 and str(df.iat[0, 1]).lower() == 'description':
+                    df = df.iloc[1:]
+                columns = [df[c].fillna('').str.replace('"', "'", regex=False) for c in self.__tsv_format[1:]]
+                self.__vardesc = dict(zip(df[self.__tsv_format[0]], zip(*columns)))
+            else:
+                # skip blank rows like pandas does
+                tsv = (r for r in csv.reader(tsv_in, delimiter='\t') if r)
+                # only the first row can be a header so we check it once instead of filtering every row
+                first = next(tsv, None)
+                if first is not None and not (len(first) > 1 and first[1].lower() == 'description'):
+                    tsv = itertools.chain([first], tsv)
+                self.__vardesc = {r[0]: (self.__safe_list_get(r, 1, '').replace('"', "'"),
+                                         self.__safe_list_get(r, 2, '').replace('"', "'"),
+                                         self.__safe_list_get(r, 3, '').replace('"', "'"),
+                                         self.__safe_list_get(r, 4, '').replace('"', "'"))
+                                  for r in tsv}
+        finally:
+            if tsv_close is not None:
+                tsv_close()
+
+        if cache_path and validator is not None:
+            self.__write_cache(cache_path, validator)
+
+    def __cache_path(self):
+        """Return the path of the pickle cache file for our tsv file
+
+        :rtype: str
+        :return: Path to the cache file
+        """
         if self._tsv_path.startswith('http://') or self._tsv_path.startswith('https://'):
-            self._log.debug('Loading {} from network into memory'.format(self._tsv_path))
-            try:
-                import requests
-            except ImportError:
-                error_msg = 'Error: Python requests module missing! Try installing via: $ pip install requests'
-                self._log.fatal(error_msg)
-                raise RuntimeError(error_msg)
-            tsv_data = requests.get(self._tsv_path).text
-            tsv_in = io.StringIO(tsv_data)
+            source = self._tsv_path
         else:
-            self._log.debug('Loading {} from disk into memory'.format(self._tsv_path))
-            tsv_in = open(self._tsv_path, 'r')
-        tsv = csv.reader(tsv_in, delimiter='\t')
-        self.__vardesc = {r[0]: {v: self.__safe_list_get(r, i, '').replace('"', "'")
-                                 for i, v in enumerate(self.__tsv_format)}
-                          for r in tsv if r[1].lower() != 'description'}
-        tsv_in.close()
+            source = os.path.abspath(self._tsv_path)
+        key = hashlib.sha256(source.encode()).hexdigest()
+        # a per user directory - unpickling files that somebody else could have planted would run their code
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_home, 'tfdescsan', key + '.pkl')
+
+    @staticmethod
+    def __private(st):
+        """Return whether a file or directory is owned by us and not writable by anyone else
+
+        :rtype: bool
+        :param st: os.stat_result of the file or directory
+        :return: True or False
+        """
+        if not hasattr(os, 'getuid'):  # no ownership information on this platform
+            return True
+        return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+    def __read_cache(self, cache_path):
+        """Read a cached description mapping from disk
+
+        :rtype: dict
+        :param cache_path: Path to the cache file
+        :return: Dict with the 'validator' and 'vardesc' of the cached mapping or None if there is no usable cache
+        """
+        try:
+            if not self.__private(os.stat(os.path.dirname(cache_path))):
+                self._log.warning('Ignoring cache %s - its directory is not private to us', cache_path)
+                return None
+            with open(cache_path, 'rb') as cache_in:
+                if not self.__private(os.fstat(cache_in.fileno())):
+                    self._log.warning('Ignoring cache %s - it is not private to us', cache_path)
+                    return None
+                cached = pickle.load(cache_in)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self._log.warning('Ignoring unreadable cache %s: %s', cache_path, e)
+            return None
+        if not (isinstance(cached, dict) and isinstance(cached.get('vardesc'), dict)
+                and isinstance(cached.get('validator'), tuple) and len(cached['validator']) == 2):
+            self._log.warning('Ignoring cache %s with unexpected content', cache_path)
+            return None
+        return cached
+
+    def __write_cache(self, cache_path, validator):
+        """Atomically write the description mapping to the cache
+
+        :param cache_path: Path to the cache file
+        :param validator: (size, mtime) of a tsv file or (ETag, Last-Modified) of a tsv URL
+        """
+        dirname, basename = os.path.split(cache_path)
+        try:
+            os.makedirs(dirname, mode=0o700, exist_ok=True)
+            if not self.__private(os.stat(dirname)):
+                self._log.warning('Not writing cache %s - its directory is not private to us', cache_path)
+                return
+            temp = tempfile.NamedTemporaryFile(prefix=basename, dir=dirname, delete=False)
+            with temp:
+                pickle.dump({'validator': validator, 'vardesc': self.__vardesc}, temp, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp.name, cache_path)
+            self._log.debug('Wrote cache %s', cache_path)
+        except OSError as e:
+            self._log.warning('Unable to write cache %s: %s', cache_path, e)
 
     @property
     def vardesc(self):
         """Return the variable description mapping
 
         :rtype: dict
-        :return: variable description mapping
+        :return: variable description mapping of variable name to a (desc, aws, gcp, azure) tuple
         """
         if len(self.__vardesc) == 0:
             self.__fill_vardesc()
@@ -151,8 +460,8 @@ class TFVarDesc:
         Read it from disk if required.
         """
         if self.__variables is None:
-            self._log.debug('Loading {} into memory'.format(self._var_path))
-            with open(self._var_path, 'r') as varin:
+            self._log.debug('Loading %s into memory', self._var_path)
+            with open(self._var_path, 'r', buffering=_BUFFER_SIZE) as varin:
                 self.__variables = varin.read()
         return self.__variables
 
@@ -163,9 +472,21 @@ class TFVarDesc:
         """
         if self.__updated_variables is None:
             self.__parse_vars()
+            # the plan is complete at this point so we freeze the variable names for fast membership tests
+            self._plan_frozen = frozenset(self._plan)
             self.__execute_plan()
         return self.__updated_variables
 
+    @property
+    def changed(self):
+        """Return whether the updated variables.tf differs from the original.
+        Parse and update the original if required.
+        """
+        updated_variables = self.updated_variables
+        if self._verify:
+            return self.variables != updated_variables
+        return self._dirty
+
     @property
     def variables_io(self):
         """Return an I/O object for our variables.tf file
@@ -186,10 +507,7 @@ class TFVarDesc:
         :param idx: Index of item in the list
         :param default: Default value to return if element at index doesn't exist
         """
-        try:
-            return l[idx]
-        except IndexError:
-            return default
+        return l[idx] if idx < len(l) else default
 
     def __parse_vars(self):
         """Parse the variables.tf file
@@ -197,7 +515,10 @@ class TFVarDesc:
         :rtype: bool
         :return: True or False
         """
-        hcl_data = hcl.load(self.variables_io)
+        if self._strict:
+            hcl_data = hcl_load(self.variables_io)
+        else:
+            hcl_data = self.__scan_vars()
         if 'variable' in hcl_data:
             var_key = 'variable'
         elif 'output' in hcl_data:
@@ -210,32 +531,117 @@ class TFVarDesc:
         for variable, data in hcl_data[var_key].items():
 
             description = None
-            if variable in self.vardesc:
-                description = self.vardesc[variable]['desc']
-                if self._cloud in self.vardesc[variable] and len(self.vardesc[variable][self._cloud]) > 0:
-                    description += ' {}'.format(self.vardesc[variable][self._cloud])
+            entry = self.vardesc.get(variable)
+            if entry:
+                description = entry[0]
+                if self._cloud_idx is not None and len(entry[self._cloud_idx]) > 0:
+                    description += ' {}'.format(entry[self._cloud_idx])
             else:
                 self.__on_mapping_missing(variable)
 
             if 'description' not in data:
-                self._log.error('Description missing for variable {}'.format(variable))
+                self._log.error('Description missing for variable %s', variable)
                 if description:
                     self.__update_plan(variable, 'insert', description)
                 else:
-                    self._log.warning('Variable {} also missing in description mapping'.format(variable))
+                    self._log.warning('Variable %s also missing in description mapping', variable)
             else:
                 if data['description'] == description:
-                    self._log.debug('Variable {} is in a good state'.format(variable))
+                    self._log.debug('Variable %s is in a good state', variable)
                 else:
                     if description:
                         self._log.warning(
-                            "Variable {} with description \"{}\" doesn't match description mapping \"{}\"".format(
-                                variable, data['description'], description))
+                            "Variable %s with description \"%s\" doesn't match description mapping \"%s\"",
+                            variable, data['description'], description)
                         self.__update_plan(variable, 'update', description)
                     else:
-                        self._log.warning(
-                            'Variable {} with description \"{}\" missing in description mapping'.format(variable, data[
-                                'description']))
+                        self._log.warning('Variable %s with description \"%s\" missing in description mapping',
+                                          variable, data['description'])
+
+    def __scan_vars(self):
+        """Scan the variables.tf file for variable and output descriptions.
+        This only understands the subset of HCL we care about and is a lot
+        faster than loading the file using the full HCL parser.
+
+        :rtype: dict
+        :return: Variables and outputs in the same layout hcl_load() would return them
+        """
+        try:
+            blocks = self.__blocks()
+        except ValueError as e:
+            self._log.warning('Unable to scan %s (%s) - falling back to the HCL parser', self._var_path, e)
+            return hcl_load(self.variables_io)
+        hcl_data = {}
+        for header, _, desc_attr, desc_value in blocks:
+            data = {}
+            if desc_attr:
+                # a description that isn't a literal is still a description, we just don't know its value
+                data['description'] = self.__literal(desc_value)
+            hcl_data.setdefault(header.group('kind'), {})[header.group('variable')] = data
+        return hcl_data
+
+    def __blocks(self):
+        """Return the top level variable and output blocks of the variables.tf file.
+        Scan the file if required.
+
+        :rtype: list
+        :return: List of (header match, index of closing bracket, description attribute match or None,
+                 description value match or None) tuples
+        """
+        if self.__scanned_blocks is None:
+            self.__scanned_blocks = list(self.__iter_blocks(self.variables))
+        return self.__scanned_blocks
+
+    @staticmethod
+    def __iter_blocks(src):
+        """Iterate over the top level variable and output blocks in a string
+
+        :param src: The HCL to scan
+        :return: Generator of (header match, index of closing bracket, description attribute match or None,
+                 description value match or None) tuples
+        """
+        header = None
+        desc_attr = None
+        desc_value = None
+        depth = 0
+        for t in _TOKEN_RE.finditer(src):
+            token = t.lastgroup
+            if token == 'comment':
+                continue
+            if desc_attr is not None and desc_attr.end() == t.start() and token in ('string', 'heredoc'):
+                desc_value = t
+            elif token == 'header':
+                if depth == 0:
+                    header, desc_attr, desc_value = t, None, None
+                depth += 1
+            elif token == 'unopened' and depth == 0:
+                raise ValueError('no opening bracket after {} in line {}'.format(
+                    t.group(0), src.count('\n', 0, t.start()) + 1))
+            elif token == 'description' and depth == 1 and header is not None and desc_attr is None:
+                desc_attr = t
+            elif token == 'open':
+                depth += 1
+            elif token == 'close' and depth > 0:
+                depth -= 1
+                if depth == 0 and header is not None:
+                    yield header, t.start(), desc_attr, desc_value
+                    header = None
+        if depth > 0 and header is not None:
+            raise ValueError('no closing bracket for {}'.format(header.group(0)))
+
+    @staticmethod
+    def __literal(t):
+        """Return the value of a string or heredoc token
+
+        :rtype: str
+        :param t: The string or heredoc token match or None
+        :return: The unescaped string, the stripped heredoc or None if there is no literal value
+        """
+        if t is None:
+            return None
+        if t.lastgroup == 'heredoc':
+            return t.group('heredoc_body').strip()
+        return t.group('string')[1:-1].replace('\\"', '"')
 
     def __update_plan(self, variable, operation, description):
         """Update the plan that leads to an updated variables.tf
@@ -247,71 +653,91 @@ class TFVarDesc:
         :return: True or False
         """
         if variable in self._plan:
-            self._log.error('Variable {} already exists in plan'.format(variable))
+            self._log.error('Variable %s already exists in plan', variable)
             return False
 
-        self._log.debug('Updating plan for {}'.format(variable))
-        self._plan[variable] = {'op': operation, 'desc': description}
+        self._log.debug('Updating plan for %s', variable)
+        # preformat the description line so executing the plan only has to prepend the indentation
+        self._plan[variable] = {'op': operation, 'desc': description,
+                                'insert_tpl': 'description = "{}"\n'.format(description.replace('"', '\\"'))}
+        self.__updated_variables = None  # the plan changed so any previous result is stale
         return True
 
     def __execute_plan(self):
         """Execute the planned modifications and create the updated variables.tf
         """
         self._log.debug('Executing plan')
-        updated_variables = []
-        update_next_description = False
-        current_variable = None
-        current_variables = self.variables_io.readlines()
-        p = re.compile(r'(variable|output)\s+"(?P<variable>.*?)"')  # todo: can variables be defined in single quotes?
-        idx = 0
-        close = False
-        while idx < len(current_variables):  # we're using manual iteration because we might want to skip some lines
-            line = current_variables[idx]
-            idx += 1
-            m = p.search(line)
-            if m:  # if the current line defines a variable
-                current_variable = m.group('variable')
-                self._log.debug('Found variable {} in line {}'.format(current_variable, idx+1))
-                if current_variable in self._plan:
-                    self._log.debug('Executing {} on {} with description "{}"'.format(self._plan[current_variable]['op'],
-                                                                                   current_variable,
-                                                                                   self._plan[current_variable][
-                                                                                       'desc']))
-                    if self._plan[current_variable]['op'] == 'insert':  # if we're adding a missing description
-                        # we want to maintain the user's style so we look ahead to see how many
-                        # whitespaces they've been using in the rest of the variable definition
-                        ws = self.__whitespaces(current_variables, idx)
-                        description = '{}description = "{}"\n'.format(ws, self._plan[current_variable]['desc'])
-                        # if the variable definition was empty and closed on the same line as the description
-                        if '}' in line:
-                            line = line.replace('}', '')  # remove the closing bracket
-                            close = True  # and set a flag that tells us to close after we added the description
-                        updated_variables.append(line)
-                        # if the opening bracket is on the next line instead of the one that defines the variable
-                        if '{' not in line and '{' in current_variables[idx]:
-                            updated_variables.append(current_variables[idx])  # append the next line
-                            idx += 1                                          # and skip to the one after
-                        updated_variables.append(description)
-                        if close:                            # if we're supposed to close the variable definition
-                            updated_variables.append('}\n')  # add the closing bracket
-                            close = False                    # and reset the flag
-                        current_variable = None
-                        continue
-                    elif self._plan[current_variable]['op'] == 'update':  # if we're updating a wrong description
-                        # we set a flag that tells us to update the next description we encounter
-                        update_next_description = True
-            # todo: maybe use a regex instead of just looking for the string 'description'
-            if update_next_description and 'description' in line:
-                line = re.sub('^(.*description\s?=\s?")(.*?)(".*)', '\\1{}\\3'.format(self._plan[current_variable]['desc']), line)
-                update_next_description = False
-                current_variable = None
-            updated_variables.append(line)
-
-        updated_variables = ''.join(updated_variables)
+        self._dirty = False
+        src = self.variables
+        buf = io.StringIO()
+        last = 0  # offset up to which src has been copied to buf
+        line_no = 1
+        line_pos = 0
+        debug = self._log.isEnabledFor(logging.DEBUG)
+        last_indent = '  '  # indentation of the last variable definition we inserted a description into
+        try:
+            blocks = self.__blocks()
+        except ValueError as e:
+            error_msg = 'Unable to find the variable definition blocks: {}'.format(e)
+            self._log.fatal(error_msg)
+            raise RuntimeError(error_msg)
+        for header, block_end, _, desc_value in blocks:
+            current_variable = header.group('variable')
+            if debug:  # counting lines is only needed for the log message
+                line_no += src.count('\n', line_pos, header.start())
+                line_pos = header.start()
+                self._log.debug('Found variable %s in line %s', current_variable, line_no)
+            if current_variable not in self._plan_frozen:
+                continue
+            entry = self._plan[current_variable]
+            op = entry['op']
+            desc = entry['desc']
+            self._log.debug('Executing %s on %s with description "%s"', op, current_variable, desc)
+            block_start = header.end() - 1  # the header ends with the opening bracket
+
+            if op == 'insert':  # if we're adding a missing description
+                line_end = src.find('\n', block_start, block_end)
+                if line_end < 0:
+                    # the variable definition was opened and closed on the same line so we open it up,
+                    # move whatever it contained and the description to lines of their own and close it
+                    buf.write(src[last:block_start + 1])
+                    buf.write('\n')
+                    content = src[block_start + 1:block_end].strip()
+                    if content:
+                        buf.write('{}{}\n'.format(last_indent, content))
+                    buf.write(last_indent + entry['insert_tpl'])
+                    buf.write('}')
+                    self._dirty = True
+                else:
+                    # we want to maintain the user's style so we look ahead to see how many
+                    # whitespaces they've been using in the rest of the variable definition
+                    ws = _WS_RE.search(src, line_end + 1, block_end)
+                    if ws:
+                        last_indent = ws.group('whitespace')
+                    buf.write(src[last:line_end + 1])
+                    buf.write(last_indent + entry['insert_tpl'])
+                    buf.write(src[line_end + 1:block_end + 1])
+                    self._dirty = True
+            elif op == 'update':  # if we're updating a wrong description
+                # replace the old description string or heredoc with the new description
+                if desc_value:
+                    buf.write(src[last:desc_value.start()])
+                    buf.write('"{}"'.format(desc.replace('"', '\\"')))
+                    buf.write(src[desc_value.end():block_end + 1])
+                    self._dirty = True
+                else:
+                    self._log.warning("Description of variable %s isn't a literal - not updating it", current_variable)
+                    buf.write(src[last:block_end + 1])
+            else:
+                continue
+            last = block_end + 1
+        buf.write(src[last:])
+
+        updated_variables = buf.getvalue()
         try:
             # try to load the generated config using the official
             # hcl lib to make sure we didn't break anything
-            hcl.load(io.StringIO(updated_variables))
+            hcl_load(io.StringIO(updated_variables))
         except ValueError:
             self._log.fatal('Generated HCL is invalid - aborting')
             raise
@@ -324,7 +750,7 @@ class TFVarDesc:
         :param variable: Name of the variable that's missing from the description mapping
         """
         for callback in self.__mapping_missing_callbacks:
-            self._log.debug('Callback {}'.format(callback))
+            self._log.debug('Callback %s', callback)
             callback(variable)
 
     def register_mapping_missing_callback(self, callback):
@@ -335,41 +761,23 @@ class TFVarDesc:
         """
         self.__mapping_missing_callbacks.append(callback)
 
-    @staticmethod
-    def __whitespaces(l, i, search_lines=3):
-        """Search the values of a list for leading whitespaces in the next couple of lines
-        starting with index i.
-
-        :rtype: str
-        :param l: List to search for leading whitespaces
-        :param i: Index from where to start searching
-        :param search_lines: Maximum number of lines to search from index
-        :return: Some number of whitespaces (tabs or spaces)
-        """
-        p = re.compile(r'^(?P<whitespace>[\t ]+)')
-        for x in range(i, i+search_lines):
-            if x < len(l):
-                m = p.search(l[x])
-                if m:
-                    return m.group('whitespace')
-        return '  '
-
     def write_updated_variables(self, out_path, on_change=False):
         """Write the updated variables to a file.
 
         :param out_path: Path to file where we should write the updated variables to
         :param on_change: Only write the file if we updated the variables
         """
-        if on_change and self.variables == self.updated_variables:
+        if on_change and not self.changed:
             self._log.debug("Variables haven't changed - skipping write")
             return
         dirname, basename = os.path.split(out_path)
-        temp = tempfile.NamedTemporaryFile(prefix=basename, dir=dirname, delete=False)
-        self._log.debug('Writing updated variables to {}'.format(temp.name))
-        temp.write(self.updated_variables.encode())
+        temp = tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', newline='', prefix=basename, dir=dirname,
+                                           delete=False, buffering=_BUFFER_SIZE)
+        self._log.debug('Writing updated variables to %s', temp.name)
+        temp.write(self.updated_variables)
         temp.close()
-        self._log.debug('Moving {} to {}'.format(temp.name, out_path))
-        os.rename(temp.name, out_path)
+        self._log.debug('Moving %s to %s', temp.name, out_path)
+        os.replace(temp.name, out_path)
 
 
 if __name__ == "__main__":